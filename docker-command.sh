@@ -72,7 +72,9 @@ if [ -n "${TLS_CERTIFICATE}" ] && [ -n "${TLS_KEY}" ]; then
     server_port="5443"
 fi
 
+# Load the application (and build its OpenAPI document) once in the master; workers inherit it on fork
 exec gunicorn --log-config ${logging_file_config} --access-logfile - \
+  --preload \
   --workers ${num_workers} \
   -t ${timeout} \
   --threads ${num_threads} \
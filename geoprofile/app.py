@@ -1,23 +1,31 @@
 import os
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from os import path, getenv, stat
-import json
+from os import path, getenv
+from time import monotonic
 import numpy as np
+import orjson
 from enum import Enum, auto
 
+import contextily as ctx
 import sqlalchemy
 from flask import Flask, abort, jsonify, after_this_request, request
 from apispec import APISpec
 from apispec_webframeworks.flask import FlaskPlugin
-from flask.json import JSONEncoder
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from flask_compress import Compress
 from flask_executor import Executor
-from flask import make_response, send_file
+from flask import make_response, send_file, Response
 from flask_wtf import FlaskForm
 import werkzeug.exceptions
+import werkzeug.utils
 
 import pandas as pd
 
+from .cache import ReportCache
 from .database import db
 from .database.model import Queue
 from .forms import ProfileFileForm, ProfilePathForm, NormalizeFileForm, NormalizePathForm, SummarizeFileForm, \
@@ -25,16 +33,20 @@ from .forms import ProfileFileForm, ProfilePathForm, NormalizeFileForm, Normaliz
 from .logging import mainLogger, accountingLogger, exception_as_rfc5424_structured_data
 from .normalize.utils import normalize_gdf, store_gdf
 from .summarize.summarization import summarize
-from .utils import create_ticket, get_tmp_dir, mkdir, validate_form, save_to_temp, check_directory_writable, \
-    get_resized_report, get_ds, uncompress_file, delete_from_temp
+from .utils import create_ticket, get_tmp_dir, get_temp_dir, mkdir, validate_form, save_to_temp, \
+    check_directory_writable, get_resized_report, get_ds, uncompress_file, uncompress_raster, delete_from_temp, \
+    file_digest, form_signature, report_to_json, upload_size, is_archive, load_to_vsimem, \
+    delete_from_vsimem, buffer_digest, is_archive_file, resolve_input_path, gdal_thread_config
 
 
 class OutputDirNotSet(Exception):
     pass
 
 
-class ProfileJsonEncoder(JSONEncoder):
-    def default(self, obj):
+class ProfileJsonProvider(DefaultJSONProvider):
+    """Serializes JSON responses with orjson, which handles numpy arrays, scalars and datetimes natively."""
+    @staticmethod
+    def default(obj):
         if isinstance(obj, np.integer):
             return int(obj)
         elif isinstance(obj, np.floating):
@@ -43,20 +55,47 @@ class ProfileJsonEncoder(JSONEncoder):
             return obj.tolist()
         elif isinstance(obj, datetime):
             return obj.isoformat()
-        else:
-            return super(JSONEncoder, self).default(obj)
+        raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
 
+    def dumps(self, obj, **kwargs) -> str:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
 
-FILE_NOT_FOUND_MESSAGE = "File not found"
 
-if getenv('OUTPUT_DIR') is None:
+OUTPUT_DIR: str = getenv('OUTPUT_DIR')
+if OUTPUT_DIR is None:
     raise OutputDirNotSet('Environment variable OUTPUT_DIR is not set.')
-
+OUTPUT_DIR = path.normpath(OUTPUT_DIR)
 
 PROFILE_TEMP_DIR: str = get_tmp_dir("profile")
 NORMALIZE_TEMP_DIR: str = get_tmp_dir("normalize")
 SUMMARIZE_TEMP_DIR: str = get_tmp_dir("summarize")
 
+# Opt-in: basemap tiles of the static maps are kept on disk, shared by all workers and across restarts
+BASEMAP_CACHE_DIR: str = getenv('BASEMAP_CACHE_DIR')
+if BASEMAP_CACHE_DIR:
+    mkdir(BASEMAP_CACHE_DIR)
+    check_directory_writable(BASEMAP_CACHE_DIR)
+    ctx.set_cache_dir(BASEMAP_CACHE_DIR)
+
+# Deferred jobs beyond this limit are rejected with 503 instead of piling up in memory
+MAX_QUEUED_JOBS: int = int(getenv('MAX_QUEUED_JOBS', 64))
+queued_jobs = threading.BoundedSemaphore(MAX_QUEUED_JOBS)
+# Prompt profile requests with larger inputs are turned into deferred ones (0 disables the limit)
+PROMPT_MAX_BYTES: int = int(getenv('PROMPT_MAX_BYTES', 0))
+# Serialized reports of recent prompt requests, reused for identical requests (0 disables the cache)
+report_cache = ReportCache(int(getenv('REPORT_CACHE_SIZE', 0)))
+# Prompt raster uploads up to this size are read by GDAL from memory, skipping the temp dir (0 disables it)
+VSIMEM_MAX_BYTES: int = int(getenv('VSIMEM_MAX_BYTES', 0))
+# Resources under OUTPUT_DIR are handed to the fronting web server with an X-Sendfile header instead of being streamed
+RESOURCE_X_SENDFILE: bool = getenv('USE_X_SENDFILE', 'false').lower() in ('true', '1')
+# Hashes uploads for the report cache, alongside the request thread staging them
+digest_pool = ThreadPoolExecutor(thread_name_prefix='digest')
+
 
 # OpenAPI documentation
 spec = APISpec(
@@ -82,66 +121,82 @@ else:
 app.config.from_mapping(
     SECRET_KEY=secret_key,
     SQLALCHEMY_DATABASE_URI=getenv('DATABASE_URI'),
-    SQLALCHEMY_ENGINE_OPTIONS={'pool_size': getenv('SQLALCHEMY_POOL_SIZE', 5),
-                               'pool_recycle': getenv('SQLALCHEMY_POOL_RECYCLE', 1800),
-                               'pool_timeout': getenv('SQLALCHEMY_POOL_TIMEOUT', 10),
-                               'pool_pre_ping': getenv('SQLALCHEMY_PRE_PING', True)},
+    SQLALCHEMY_ENGINE_OPTIONS={'pool_size': int(getenv('SQLALCHEMY_POOL_SIZE', 5)),
+                               'max_overflow': int(getenv('SQLALCHEMY_MAX_OVERFLOW', 10)),
+                               'pool_recycle': int(getenv('SQLALCHEMY_POOL_RECYCLE', 1800)),
+                               'pool_timeout': float(getenv('SQLALCHEMY_POOL_TIMEOUT', 10)),
+                               'pool_pre_ping': getenv('SQLALCHEMY_PRE_PING', 'true').lower() in ('true', '1')},
     SQLALCHEMY_TRACK_MODIFICATIONS=False,
     EXECUTOR_TYPE="thread",
-    EXECUTOR_MAX_WORKERS="1"
+    EXECUTOR_MAX_WORKERS=int(getenv('EXECUTOR_MAX_WORKERS', 1)),
+    MAX_CONTENT_LENGTH=int(getenv('MAX_CONTENT_LENGTH', 0)) or None
 )
 
-app.json_encoder = ProfileJsonEncoder
+app.json = ProfileJsonProvider(app)
+
+
+def store_result(ticket: str, result, job_type: JobType):
+    """Write the result of a job under OUTPUT_DIR and return its path (None if the job produced no result)."""
+    if result is None:
+        return None
+    output_path: str = f"{OUTPUT_DIR}/{datetime.now().strftime('%y%m%d')}/{ticket}"
+    mkdir(output_path)
+    filepath = None
+    if job_type is JobType.PROFILE:
+        filepath = f"{output_path}/result.json"
+        with open(filepath, 'wb') as fp:
+            fp.write(report_to_json(result))
+    elif job_type is JobType.NORMALIZE:
+        gdf, resource_type, file_name = result
+        filepath = store_gdf(gdf, resource_type, file_name, output_path)
+    elif job_type is JobType.SUMMARIZE:
+        filepath = f"{output_path}/result.json"
+        with open(filepath, 'wb') as fp:
+            # The same serialization as the prompt response
+            fp.write(app.json.dumps(result).encode('utf-8'))
+    return filepath
 
 
 def executor_callback(future):
     """The callback function called when a job has completed."""
     ticket, result, job_type, success, comment = future.result()
-    if result is not None:
-        rel_path = datetime.now().strftime("%y%m%d")
-        rel_path = path.join(rel_path, ticket)
-        output_path: str = path.join(getenv('OUTPUT_DIR'), rel_path)
-        mkdir(output_path)
-        filepath = None
-        if job_type is JobType.PROFILE:
-            filepath = path.join(getenv('OUTPUT_DIR'), rel_path, "result.json")
-            result.to_file(filepath)
-        elif job_type is JobType.NORMALIZE:
-            gdf, resource_type, file_name = result
-            filepath = store_gdf(gdf, resource_type, file_name, output_path)
-        elif job_type is JobType.SUMMARIZE:
-            filepath = path.join(getenv('OUTPUT_DIR'), rel_path, "result.json")
-            with open(filepath, 'w') as fp:
-                json.dump(result, fp)
-    else:
-        filepath = None
+    try:
+        filepath = store_result(ticket, result, job_type)
+    except Exception as e:
+        mainLogger.error('Storing the result of ticket: %s failed with error `%s`.', ticket, e,
+                         extra=exception_as_rfc5424_structured_data(e))
+        filepath, success, comment = None, 0, str(e)
     with app.app_context():
-        elem: Queue = Queue().query.filter_by(ticket=ticket).first()
-        print(elem)
-        time = elem.requested_time
-        filesize = elem.filesize
-        execution_time = round((datetime.now(timezone.utc) - time.replace(tzinfo=timezone.utc)).total_seconds(), 3)
-
-        elem.result = filepath
-        elem.success = success
-        elem.status = 1
-        elem.execution_time = execution_time
-        elem.comment = comment
-        db.session.add(elem)
-        db.session.commit()
-        accountingLogger(ticket=ticket, success=success, execution_start=time, execution_time=execution_time,
-                         comment=comment, filesize=filesize)
-
-        if job_type is JobType.PROFILE:
-            delete_from_temp(PROFILE_TEMP_DIR, ticket)
-        elif job_type is JobType.NORMALIZE:
-            delete_from_temp(NORMALIZE_TEMP_DIR, ticket)
-        elif job_type is JobType.SUMMARIZE:
-            delete_from_temp(SUMMARIZE_TEMP_DIR, ticket)
+        try:
+            time, filesize = Queue.query.with_entities(Queue.requested_time, Queue.filesize) \
+                .filter_by(ticket=ticket).one()
+            if time.tzinfo is None:
+                # SQLite returns naive timestamps, stored in UTC
+                time = time.replace(tzinfo=timezone.utc)
+            execution_time = round((datetime.now(timezone.utc) - time).total_seconds(), 3)
+
+            Queue.query.filter_by(ticket=ticket).update({'result': filepath, 'success': success, 'status': 1,
+                                                         'execution_time': execution_time, 'comment': comment},
+                                                        synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            mainLogger.error('Completing ticket: %s failed with error `%s`.', ticket, e,
+                             extra=exception_as_rfc5424_structured_data(e))
+            # Still close the ticket, so that it does not appear to be pending forever
+            db.session.rollback()
+            success = 0
+            Queue.query.filter_by(ticket=ticket).update({'success': 0, 'status': 1, 'comment': str(e)},
+                                                        synchronize_session=False)
+            db.session.commit()
+        else:
+            accountingLogger(ticket=ticket, success=success, execution_start=time, execution_time=execution_time,
+                             comment=comment, filesize=filesize)
+        finally:
+            delete_from_temp(JOB_TEMP_DIRS[job_type], ticket)
         if success:
-            mainLogger.info(f'Processing of ticket: {ticket} is completed successfully')
+            mainLogger.info('Processing of ticket: %s is completed successfully', ticket)
         else:
-            mainLogger.info(f'Processing of ticket: {ticket} completed with errors')
+            mainLogger.info('Processing of ticket: %s completed with errors', ticket)
 
 
 # Ensure the instance folder exists and initialize application, db and executor.
@@ -151,13 +206,24 @@ executor = Executor(app)
 executor.add_default_done_callback(executor_callback)
 
 # Enable CORS
-if getenv('CORS') is not None:
-    if getenv('CORS')[0:1] == '[':
-        origins = json.loads(getenv('CORS'))
+cors_origins = getenv('CORS')
+if cors_origins is not None:
+    if cors_origins[0:1] == '[':
+        origins = tuple(orjson.loads(cors_origins))
     else:
-        origins = getenv('CORS')
+        origins = cors_origins
     cors = CORS(app, origins=origins)
 
+# Compress JSON responses (reports with heatmaps and clusters compress very well)
+app.config.update(
+    COMPRESS_ALGORITHM=['br', 'gzip'],
+    COMPRESS_MIMETYPES=['application/json'],
+    COMPRESS_MIN_SIZE=4096,
+    COMPRESS_LEVEL=4,
+    COMPRESS_BR_LEVEL=4
+)
+Compress(app)
+
 
 with app.app_context():
     import geoprofile.cli
@@ -169,53 +235,190 @@ class JobType(Enum):
     SUMMARIZE = auto()
 
 
+JOB_TEMP_DIRS = {
+    JobType.PROFILE: PROFILE_TEMP_DIR,
+    JobType.NORMALIZE: NORMALIZE_TEMP_DIR,
+    JobType.SUMMARIZE: SUMMARIZE_TEMP_DIR,
+}
+
+
+def stage_input(src_path: str, file_type: str) -> str:
+    """Uncompress the input (if needed) and return the path to read it from.
+
+    Vector spreadsheets are converted to CSV next to the original.
+    """
+    if file_type == 'raster':
+        return uncompress_raster(src_path)
+    src_path = uncompress_file(src_path)
+    if file_type == 'vector' and (src_path.endswith('.xlsx') or src_path.endswith('.xls')):
+        read_file = pd.read_excel(src_path)
+        src_path = src_path.split(".")[0] + ".csv"
+        read_file.to_csv(src_path, index=None, header=True)
+    return src_path
+
+
+def profile(src_path: str, form: FlaskForm, file_type: str):
+    """Profile a (possibly compressed) file and return the report."""
+    ds = get_ds(stage_input(src_path, file_type), form, file_type)
+    return get_resized_report(ds, form, file_type)
+
+
+def profile_in_place(src_path: str, form: FlaskForm, file_type: str):
+    """Profile a file where it lies under INPUT_DIR, without GDAL writing .aux.xml sidecars next to it."""
+    with gdal_thread_config('GDAL_PAM_ENABLED', 'NO'):
+        return profile(src_path, form, file_type)
+
+
+def cached_report(cache_key, make_report) -> bytes:
+    """Return the serialized report of an identical earlier request, or make (and cache) a new one."""
+    report_json = report_cache.get(cache_key)
+    if report_json is None:
+        report_json = report_to_json(make_report())
+        report_cache.put(cache_key, report_json)
+    else:
+        mainLogger.info('Serving cached report for `%s`', cache_key[0])
+    return report_json
+
+
+def cached_profile(upload_path: str, form: FlaskForm, file_type: str) -> bytes:
+    """Profile an uploaded file and return the serialized report, reusing the cached one of an identical request.
+
+    The upload is hashed in the background while it is being uncompressed, so that the cache
+    lookup adds no more than the longest of the two to the staging of the input.
+    """
+    if not report_cache.enabled:
+        return report_to_json(profile(upload_path, form, file_type))
+    digest = digest_pool.submit(file_digest, upload_path)
+    src_path = stage_input(upload_path, file_type)
+    cache_key = (digest.result(), file_type, form_signature(form))
+    return cached_report(cache_key, lambda: get_resized_report(get_ds(src_path, form, file_type), form, file_type))
+
+
+def path_cache_key(src_path: str, file_type: str, form: FlaskForm):
+    """The report cache key of a prompt request for a file under INPUT_DIR.
+
+    The file is identified by its real path, modification time and size, so that a replaced file is profiled again.
+    """
+    if not report_cache.enabled or form.response.data != "prompt":
+        return None
+    st = os.stat(src_path)
+    return path.realpath(src_path), st.st_mtime_ns, st.st_size, file_type, form_signature(form)
+
+
+def readable_in_place(src_path: str, form: FlaskForm) -> bool:
+    """Whether a prompt request for a file under INPUT_DIR can be profiled in place, without a copy in the temp dir."""
+    return path.isfile(src_path) and form.response.data == "prompt" \
+        and not exceeds_prompt_limit(path.getsize(src_path)) and not is_archive_file(src_path)
+
+
+def fits_in_memory(form: FlaskForm) -> bool:
+    """Whether a raster upload may be profiled straight from memory, instead of a copy in the temp dir."""
+    if not VSIMEM_MAX_BYTES:
+        return False
+    size = upload_size(form)
+    return size <= VSIMEM_MAX_BYTES and form.response.data == "prompt" and not exceeds_prompt_limit(size) \
+        and not is_archive(form.resource.data.stream)
+
+
+def profile_in_memory(form: FlaskForm, ticket: str, file_type: str) -> bytes:
+    """Profile an uploaded file through GDAL's in-memory filesystem and return the serialized report."""
+    data = form.resource.data.stream.read()
+    cache_key = (buffer_digest(data), file_type, form_signature(form)) if report_cache.enabled else None
+
+    def make_report():
+        vsimem_path = load_to_vsimem(form, ticket, data)
+        try:
+            return get_resized_report(get_ds(vsimem_path, form, file_type), form, file_type)
+        finally:
+            delete_from_vsimem(vsimem_path)
+    return cached_report(cache_key, make_report)
+
+
+def json_response(body: bytes, status: int = 200) -> Response:
+    """Wrap an already serialized JSON body into a response."""
+    return Response(body, status=status, mimetype='application/json')
+
+
 @executor.job
 def enqueue(ticket: str, src_path: str, file_type: str, form: FlaskForm, job_type: JobType) -> tuple:
     """Enqueue a job (in case requested response type is 'deferred')."""
-    mainLogger.info(f'Starting processing file `{src_path}` with ticket {ticket}')
+    mainLogger.info('Starting processing file `%s` with ticket %s', src_path, ticket)
     try:
         result = None
         if job_type is JobType.PROFILE:
-            result = {}
-            if file_type == 'netcdf':
-                ds = get_ds(src_path, form, 'netcdf')
-                result = get_resized_report(ds, form, 'netcdf')
-            elif file_type == 'raster':
-                ds = get_ds(src_path, form, 'raster')
-                result = get_resized_report(ds, form, 'raster')
-            elif file_type == 'vector':
-                ds = get_ds(src_path, form, 'vector')
-                result = get_resized_report(ds, form, 'vector')
+            result = profile(src_path, form, file_type)
         elif job_type is JobType.NORMALIZE:
             gdf = get_ds(src_path, form, 'vector')
             gdf = normalize_gdf(form, gdf)
             file_name = path.split(src_path)[1].split('.')[0] + '_normalized'
             result = gdf, form.resource_type.data, file_name
         elif job_type is JobType.SUMMARIZE:
-            gdf = get_ds(src_path, form, 'vector').to_geopandas_df()
-            df = pd.DataFrame(gdf.drop(columns='geometry'))
-            json_summary = summarize(df, form)
-            result = json_summary
+            gdf = get_ds(src_path, form, 'vector')
+            result = summarize(gdf, form)
     except Exception as e:
-        mainLogger.error(f'Processing of ticket: {ticket} failed with error `{e}`.',
+        mainLogger.error('Processing of ticket: %s failed with error `%s`.', ticket, e,
                          extra=exception_as_rfc5424_structured_data(e))
         return ticket, None, job_type, 0, str(e)
     else:
         return ticket, result, job_type, 1, None
 
 
-def init_ticket_to_postgres(ticket: str, src_path: str):
-    filesize = stat(src_path).st_size
+def exceeds_prompt_limit(filesize: int) -> bool:
+    """Whether an input is above PROMPT_MAX_BYTES, and the request does not force a prompt response."""
+    return bool(PROMPT_MAX_BYTES) and filesize > PROMPT_MAX_BYTES \
+        and request.headers.get('X-Force-Prompt', '').lower() not in ('1', 'true')
+
+
+def is_prompt(form: FlaskForm, filesize: int) -> bool:
+    """Whether to profile within the request; inputs above PROMPT_MAX_BYTES are deferred unless forced."""
+    if form.response.data != "prompt":
+        return False
+    if exceeds_prompt_limit(filesize):
+        mainLogger.info('Deferring prompt request: input of %d bytes exceeds %d bytes', filesize, PROMPT_MAX_BYTES)
+        return False
+    return True
+
+
+def init_ticket_to_postgres(ticket: str, filesize: int):
     queue = Queue(ticket=ticket, filesize=filesize)
     db.session.add(queue)
     db.session.commit()
 
 
+# Tickets are UUIDs, so they can be placed in the JSON body without escaping
+TICKET_ACCEPTED_JSON = '{{"ticket":"{ticket}","endpoint":"/resource/{ticket}","status":"/status/{ticket}"}}'
+
+
+def submit_job(ticket: str, src_path: str, filesize: int, file_type: str, form: FlaskForm, job_type: JobType):
+    """Register the ticket and queue the job, or reject it with 503 if the queue is full."""
+    slots = queued_jobs
+    if not slots.acquire(blocking=False):
+        delete_from_temp(JOB_TEMP_DIRS[job_type], ticket)
+        mainLogger.warning('Rejected ticket %s: %d jobs are already queued', ticket, MAX_QUEUED_JOBS)
+        abort(503, 'Too many queued jobs, please try again later.')
+    try:
+        init_ticket_to_postgres(ticket, filesize)
+        future = enqueue.submit(ticket, src_path, file_type=file_type, form=form, job_type=job_type)
+    except Exception:
+        slots.release()
+        delete_from_temp(JOB_TEMP_DIRS[job_type], ticket)
+        raise
+    # Runs after executor_callback, and returns the slot to the semaphore it was taken from
+    future.add_done_callback(lambda _: slots.release())
+    return json_response(TICKET_ACCEPTED_JSON.format(ticket=ticket).encode(), 202)
+
+
 @app.route("/")
 def index():
     """The index route, gives info about the API endpoints."""
-    mainLogger.info('Generating OpenAPI document...')
-    return make_response(spec.to_dict(), 200)
+    mainLogger.info('Serving OpenAPI document...')
+    return Response(SPEC_JSON, status=200, mimetype='application/json')
+
+
+# Seconds during which a successful filesystem health check is not repeated
+FILESYSTEM_CHECK_INTERVAL = 30
+filesystem_checked_at = float('-inf')
+HEALTH_OK_JSON: bytes = orjson.dumps({'status': 'OK', 'details': {'gdal': 'OK', 'filesystem': 'OK', 'db': 'OK'}})
 
 
 @app.route("/_health")
@@ -262,26 +465,29 @@ def health_check():
             sts = False
             break
 
-    # Check that temp directory is writable
-    for dir_path in [os.environ['TEMPDIR'], os.environ['OUTPUT_DIR']]:
-        try:
-            check_directory_writable(dir_path)
-        except Exception as e:
-            msg['filesystem'] = str(e)
-            sts = False
-            break
+    # Check that temp directory is writable (a successful check is trusted for a while)
+    global filesystem_checked_at
+    if monotonic() - filesystem_checked_at > FILESYSTEM_CHECK_INTERVAL:
+        for dir_path in [get_temp_dir(), OUTPUT_DIR]:
+            try:
+                check_directory_writable(dir_path)
+            except Exception as e:
+                msg['filesystem'] = str(e)
+                sts = False
+                break
+        else:
+            filesystem_checked_at = monotonic()
 
     try:
-        url = os.environ['DATABASE_URI']
-        engine = sqlalchemy.create_engine(url)
-        conn = engine.connect()
-        conn.execute('SELECT 1')
-        mainLogger.debug("_checkConnectToDB(): Connected to %s", engine.url)
+        db.session.execute(sqlalchemy.text('SELECT 1'))
+        mainLogger.debug("_checkConnectToDB(): Connected to %s", db.engine.url)
     except Exception as e:
         msg['db'] = str(e)
         sts = False
 
-    return make_response({'status': 'OK' if sts else 'FAILED', 'details': msg}, 200)
+    if sts:
+        return Response(HEALTH_OK_JSON, status=200, mimetype='application/json')
+    return make_response({'status': 'FAILED', 'details': msg}, 200)
 
 
 @app.route("/profile/file/netcdf", methods=["POST"])
@@ -325,6 +531,10 @@ def profile_file_netcdf():
                     height:
                       type: integer
                       description: The height (in pixels) of the static map to be generated
+                    exclude_static:
+                      type: boolean
+                      default: false
+                      description: Omit the static maps (*mbrStatic*, *convexHullStatic*, *thumbnail*, *heatmapStatic*, *clustersStatic*) from the report; they are returned as null.
                     lat:
                       type: string
                       description: The column name with the latitude information
@@ -521,24 +731,18 @@ def profile_file_netcdf():
     mainLogger.info(f"Starting /profile/file/netcdf with file: {form.resource.data.filename}")
     ticket: str = create_ticket()
     requests_temp_dir: str = path.join(PROFILE_TEMP_DIR, ticket)
-    src_file_path: str = save_to_temp(form, requests_temp_dir)
-    src_file_path = uncompress_file(src_file_path)
+    src_file_path, filesize = save_to_temp(form, requests_temp_dir)
 
     # Immediate results
-    if form.response.data == "prompt":
+    if is_prompt(form, filesize):
         @after_this_request
         def cleanup_temp(resp):
-            delete_from_temp(PROFILE_TEMP_DIR, ticket)
+            resp.call_on_close(lambda: delete_from_temp(PROFILE_TEMP_DIR, ticket))
             return resp
-        ds = get_ds(src_file_path, form, 'netcdf')
-        report = get_resized_report(ds, form, 'netcdf')
-        return make_response(report.to_json(), 200)
+        return json_response(cached_profile(src_file_path, form, 'netcdf'))
     # Wait for results
     else:
-        init_ticket_to_postgres(ticket, src_file_path)
-        enqueue.submit(ticket, src_file_path, file_type="netcdf", form=form, job_type=JobType.PROFILE)
-        response = {"ticket": ticket, "endpoint": f"/resource/{ticket}", "status": f"/status/{ticket}"}
-        return make_response(response, 202)
+        return submit_job(ticket, src_file_path, filesize, "netcdf", form, JobType.PROFILE)
 
 
 @app.route("/profile/file/raster", methods=["POST"])
@@ -565,6 +769,10 @@ def profile_file_raster():
                       enum: [prompt, deferred]
                       default: prompt
                       description: Determines whether the profile process should be promptly initiated (*prompt*) or queued (*deferred*). In the first case, the response waits for the result, in the second the response is immediate returning a ticket corresponding to the request.
+                    exclude_static:
+                      type: boolean
+                      default: false
+                      description: Omit the static maps (*mbrStatic*, *convexHullStatic*, *thumbnail*, *heatmapStatic*, *clustersStatic*) from the report; they are returned as null.
                   required:
                     - resource
           responses:
@@ -756,25 +964,21 @@ def profile_file_raster():
     validate_form(form, mainLogger)
     mainLogger.info(f"Starting /profile/file/raster with file: {form.resource.data.filename}")
     ticket: str = create_ticket()
+    if fits_in_memory(form):
+        return json_response(profile_in_memory(form, ticket, 'raster'))
     requests_temp_dir: str = path.join(PROFILE_TEMP_DIR, ticket)
-    src_file_path: str = save_to_temp(form, requests_temp_dir)
-    src_file_path = uncompress_file(src_file_path)
+    src_file_path, filesize = save_to_temp(form, requests_temp_dir)
 
     # Wait for results
-    if form.response.data == "prompt":
+    if is_prompt(form, filesize):
         @after_this_request
         def cleanup_temp(resp):
-            delete_from_temp(PROFILE_TEMP_DIR, ticket)
+            resp.call_on_close(lambda: delete_from_temp(PROFILE_TEMP_DIR, ticket))
             return resp
-        ds = get_ds(src_file_path, form, 'raster')
-        response = get_resized_report(ds, form, 'raster').to_json()
-        return make_response(response, 200)
+        return json_response(cached_profile(src_file_path, form, 'raster'))
     # Wait for results
     else:
-        init_ticket_to_postgres(ticket, src_file_path)
-        enqueue.submit(ticket, src_file_path, file_type="raster", form=form, job_type=JobType.PROFILE)
-        response = {"ticket": ticket, "endpoint": f"/resource/{ticket}", "status": f"/status/{ticket}"}
-        return make_response(response, 202)
+        return submit_job(ticket, src_file_path, filesize, "raster", form, JobType.PROFILE)
 
 
 @app.route("/profile/file/vector", methods=["POST"])
@@ -818,6 +1022,10 @@ def profile_file_vector():
                     height:
                       type: integer
                       description: The height (in pixels) of the static map to be generated
+                    exclude_static:
+                      type: boolean
+                      default: false
+                      description: Omit the static maps (*mbrStatic*, *convexHullStatic*, *thumbnail*, *heatmapStatic*, *clustersStatic*) from the report; they are returned as null.
                     lat:
                       type: string
                       description: The column name with the latitude information
@@ -1214,27 +1422,17 @@ def profile_file_vector():
     mainLogger.info(f"Starting /profile/file/vector with file: {form.resource.data.filename}")
     ticket: str = create_ticket()
     requests_temp_dir: str = path.join(PROFILE_TEMP_DIR, ticket)
-    src_file_path: str = save_to_temp(form, requests_temp_dir)
-    src_file_path = uncompress_file(src_file_path)
-    if src_file_path.endswith('.xlsx') or src_file_path.endswith('.xls'):
-        read_file = pd.read_excel(src_file_path)
-        src_file_path = src_file_path.split(".")[0] + ".csv"
-        read_file.to_csv(src_file_path, index=None, header=True)
+    src_file_path, filesize = save_to_temp(form, requests_temp_dir)
     # Wait for results
-    if form.response.data == "prompt":
+    if is_prompt(form, filesize):
         @after_this_request
         def cleanup_temp(resp):
-            delete_from_temp(PROFILE_TEMP_DIR, ticket)
+            resp.call_on_close(lambda: delete_from_temp(PROFILE_TEMP_DIR, ticket))
             return resp
-        ds = get_ds(src_file_path, form, 'vector')
-        report = get_resized_report(ds, form, 'vector')
-        return make_response(report.to_json(), 200)
+        return json_response(cached_profile(src_file_path, form, 'vector'))
     # Wait for results
     else:
-        init_ticket_to_postgres(ticket, src_file_path)
-        enqueue.submit(ticket, src_file_path, file_type="vector", form=form, job_type=JobType.PROFILE)
-        response = {"ticket": ticket, "endpoint": f"/resource/{ticket}", "status": f"/status/{ticket}"}
-        return make_response(response, 202)
+        return submit_job(ticket, src_file_path, filesize, "vector", form, JobType.PROFILE)
 
 
 @app.route("/profile/path/netcdf", methods=["POST"])
@@ -1278,6 +1476,10 @@ def profile_path_netcdf():
                     height:
                       type: integer
                       description: The height (in pixels) of the static map to be generated
+                    exclude_static:
+                      type: boolean
+                      default: false
+                      description: Omit the static maps (*mbrStatic*, *convexHullStatic*, *thumbnail*, *heatmapStatic*, *clustersStatic*) from the report; they are returned as null.
                     lat:
                       type: string
                       description: The column name with the latitude information
@@ -1472,31 +1674,31 @@ def profile_path_netcdf():
     form = ProfilePathForm()
     validate_form(form, mainLogger)
     mainLogger.info(f"Starting /profile/path/netcdf with file: {form.resource.data}")
-    src_file_path: str = path.join(getenv('INPUT_DIR', ''), form.resource.data)
+    src_file_path: str = resolve_input_path(form.resource.data)
+
+    cache_key = path_cache_key(src_file_path, 'netcdf', form)
+    report_json = report_cache.get(cache_key)
+    if report_json is not None:
+        return json_response(report_json)
 
-    if not path.exists(src_file_path):
-        abort(400, FILE_NOT_FOUND_MESSAGE)
+    # Plain files are only read, so there is no need for a private copy
+    if readable_in_place(src_file_path, form):
+        return json_response(cached_report(cache_key, lambda: profile_in_place(src_file_path, form, 'netcdf')))
 
     ticket: str = create_ticket()
     requests_temp_dir: str = path.join(PROFILE_TEMP_DIR, ticket)
-    src_file_path: str = save_to_temp(form, requests_temp_dir, input_type="path")
-    src_file_path = uncompress_file(src_file_path)
+    src_file_path, filesize = save_to_temp(form, requests_temp_dir, input_type="path", src_file_path=src_file_path)
 
     # Immediate results
-    if form.response.data == "prompt":
+    if is_prompt(form, filesize):
         @after_this_request
         def cleanup_temp(resp):
-            delete_from_temp(PROFILE_TEMP_DIR, ticket)
+            resp.call_on_close(lambda: delete_from_temp(PROFILE_TEMP_DIR, ticket))
             return resp
-        ds = get_ds(src_file_path, form, 'netcdf')
-        report = get_resized_report(ds, form, 'netcdf')
-        return make_response(report.to_json(), 200)
+        return json_response(cached_report(cache_key, lambda: profile(src_file_path, form, 'netcdf')))
     # Wait for results
     else:
-        init_ticket_to_postgres(ticket, src_file_path)
-        enqueue.submit(ticket, src_file_path, file_type="netcdf", form=form, job_type=JobType.PROFILE)
-        response = {"ticket": ticket, "endpoint": f"/resource/{ticket}", "status": f"/status/{ticket}"}
-        return make_response(response, 202)
+        return submit_job(ticket, src_file_path, filesize, "netcdf", form, JobType.PROFILE)
 
 
 @app.route("/profile/path/raster", methods=["POST"])
@@ -1523,6 +1725,10 @@ def profile_path_raster():
                       enum: [prompt, deferred]
                       default: prompt
                       description: Determines whether the profile process should be promptly initiated (*prompt*) or queued (*deferred*). In the first case, the response waits for the result, in the second the response is immediate returning a ticket corresponding to the request.
+                    exclude_static:
+                      type: boolean
+                      default: false
+                      description: Omit the static maps (*mbrStatic*, *convexHullStatic*, *thumbnail*, *heatmapStatic*, *clustersStatic*) from the report; they are returned as null.
                   required:
                     - resource
           responses:
@@ -1713,31 +1919,31 @@ def profile_path_raster():
     form = ProfilePathForm()
     validate_form(form, mainLogger)
     mainLogger.info(f"Starting /profile/path/raster with file: {form.resource.data}")
-    src_file_path: str = path.join(getenv('INPUT_DIR', ''), form.resource.data)
+    src_file_path: str = resolve_input_path(form.resource.data)
+
+    cache_key = path_cache_key(src_file_path, 'raster', form)
+    report_json = report_cache.get(cache_key)
+    if report_json is not None:
+        return json_response(report_json)
 
-    if not path.exists(src_file_path):
-        abort(400, FILE_NOT_FOUND_MESSAGE)
+    # Plain files are only read, so there is no need for a private copy
+    if readable_in_place(src_file_path, form):
+        return json_response(cached_report(cache_key, lambda: profile_in_place(src_file_path, form, 'raster')))
 
     ticket: str = create_ticket()
     requests_temp_dir: str = path.join(PROFILE_TEMP_DIR, ticket)
-    src_file_path: str = save_to_temp(form, requests_temp_dir, input_type="path")
-    src_file_path = uncompress_file(src_file_path)
+    src_file_path, filesize = save_to_temp(form, requests_temp_dir, input_type="path", src_file_path=src_file_path)
 
     # Wait for results
-    if form.response.data == "prompt":
+    if is_prompt(form, filesize):
         @after_this_request
         def cleanup_temp(resp):
-            delete_from_temp(PROFILE_TEMP_DIR, ticket)
+            resp.call_on_close(lambda: delete_from_temp(PROFILE_TEMP_DIR, ticket))
             return resp
-        ds = get_ds(src_file_path, form, 'raster')
-        response = get_resized_report(ds, form, 'raster').to_json()
-        return make_response(response, 200)
+        return json_response(cached_report(cache_key, lambda: profile(src_file_path, form, 'raster')))
     # Wait for results
     else:
-        init_ticket_to_postgres(ticket, src_file_path)
-        enqueue.submit(ticket, src_file_path, file_type="raster", form=form, job_type=JobType.PROFILE)
-        response = {"ticket": ticket, "endpoint": f"/resource/{ticket}", "status": f"/status/{ticket}"}
-        return make_response(response, 202)
+        return submit_job(ticket, src_file_path, filesize, "raster", form, JobType.PROFILE)
 
 
 @app.route("/profile/path/vector", methods=["POST"])
@@ -1781,6 +1987,10 @@ def profile_path_vector():
                     height:
                       type: integer
                       description: The height (in pixels) of the static map to be generated
+                    exclude_static:
+                      type: boolean
+                      default: false
+                      description: Omit the static maps (*mbrStatic*, *convexHullStatic*, *thumbnail*, *heatmapStatic*, *clustersStatic*) from the report; they are returned as null.
                     lat:
                       type: string
                       description: The column name with the latitude information
@@ -2175,56 +2385,44 @@ def profile_path_vector():
     form = ProfilePathForm()
     validate_form(form, mainLogger)
     mainLogger.info(f"Starting /profile/path/vector with file: {form.resource.data}")
-    src_file_path: str = path.join(getenv('INPUT_DIR', ''), form.resource.data)
+    src_file_path: str = resolve_input_path(form.resource.data)
 
-    if not path.exists(src_file_path):
-        abort(400, FILE_NOT_FOUND_MESSAGE)
+    cache_key = path_cache_key(src_file_path, 'vector', form)
+    report_json = report_cache.get(cache_key)
+    if report_json is not None:
+        return json_response(report_json)
 
     ticket: str = create_ticket()
     requests_temp_dir: str = path.join(PROFILE_TEMP_DIR, ticket)
-    src_file_path: str = save_to_temp(form, requests_temp_dir, input_type="path")
-    src_file_path = uncompress_file(src_file_path)
-    if src_file_path.endswith('.xlsx') or src_file_path.endswith('.xls'):
-        read_file = pd.read_excel(src_file_path)
-        src_file_path = src_file_path.split(".")[0] + ".csv"
-        read_file.to_csv(src_file_path, index=None, header=True)
+    src_file_path, filesize = save_to_temp(form, requests_temp_dir, input_type="path", src_file_path=src_file_path)
 
     # Wait for results
-    if form.response.data == "prompt":
+    if is_prompt(form, filesize):
         @after_this_request
         def cleanup_temp(resp):
-            delete_from_temp(PROFILE_TEMP_DIR, ticket)
+            resp.call_on_close(lambda: delete_from_temp(PROFILE_TEMP_DIR, ticket))
             return resp
-        ds = get_ds(src_file_path, form, 'vector')
-        report = get_resized_report(ds, form, 'vector')
-        return make_response(report.to_json(), 200)
+        return json_response(cached_report(cache_key, lambda: profile(src_file_path, form, 'vector')))
     # Wait for results
     else:
-        init_ticket_to_postgres(ticket, src_file_path)
-        enqueue.submit(ticket, src_file_path, file_type="vector", form=form, job_type=JobType.PROFILE)
-        response = {"ticket": ticket, "endpoint": f"/resource/{ticket}", "status": f"/status/{ticket}"}
-        return make_response(response, 202)
+        return submit_job(ticket, src_file_path, filesize, "vector", form, JobType.PROFILE)
 
 
-def normalize_endpoint(form: FlaskForm, src_file_path: str, ticket: str, requests_temp_dir: str):
+def normalize_endpoint(form: FlaskForm, src_file_path: str, filesize: int, ticket: str, requests_temp_dir: str):
     # Immediate results
     if form.response.data == "prompt":
         @after_this_request
         def cleanup_temp(resp):
-            delete_from_temp(NORMALIZE_TEMP_DIR, ticket)
+            resp.call_on_close(lambda: delete_from_temp(NORMALIZE_TEMP_DIR, ticket))
             return resp
         gdf = get_ds(src_file_path, form, 'vector')
         gdf = normalize_gdf(form, gdf)
         file_name = path.split(src_file_path)[1].split('.')[0] + '_normalized'
         output_file = store_gdf(gdf, form.resource_type.data, file_name, requests_temp_dir)
-        file_content = open(output_file, 'rb')
-        return send_file(file_content, download_name=path.basename(output_file), as_attachment=True)
+        return send_file(output_file, download_name=path.basename(output_file), as_attachment=True)
     # Wait for results
     else:
-        init_ticket_to_postgres(ticket, src_file_path)
-        enqueue.submit(ticket, src_file_path, file_type="vector", form=form, job_type=JobType.NORMALIZE)
-        response = {"ticket": ticket, "endpoint": f"/resource/{ticket}", "status": f"/status/{ticket}"}
-        return make_response(response, 202)
+        return submit_job(ticket, src_file_path, filesize, "vector", form, JobType.NORMALIZE)
 
 
 @app.route("/normalize/file", methods=["POST"])
@@ -2253,7 +2451,7 @@ def normalize_file():
                       description: Determines whether the profile process should be promptly initiated (*prompt*) or queued (*deferred*). In the first case, the response waits for the result, in the second the response is immediate returning a ticket corresponding to the request.
                     resource_type:
                       type: string
-                      enum: [csv, shp]
+                      enum: [csv, shp, parquet]
                       description: The file type of the resource
                     csv_delimiter:
                       type: string
@@ -2309,6 +2507,9 @@ def normalize_file():
                   - application/zip:
                       schema:
                         type: object
+                  - application/vnd.apache.parquet:
+                      schema:
+                        type: object
             202:
               description: Accepted for processing, but normalization has not been completed.
               content:
@@ -2338,9 +2539,9 @@ def normalize_file():
     validate_form(form, mainLogger)
     ticket: str = create_ticket()
     requests_temp_dir: str = path.join(NORMALIZE_TEMP_DIR, ticket)
-    src_file_path: str = save_to_temp(form, requests_temp_dir)
+    src_file_path, filesize = save_to_temp(form, requests_temp_dir)
     src_file_path = uncompress_file(src_file_path)
-    return normalize_endpoint(form, src_file_path, ticket, requests_temp_dir)
+    return normalize_endpoint(form, src_file_path, filesize, ticket, requests_temp_dir)
 
 
 @app.route("/normalize/path", methods=["POST"])
@@ -2369,7 +2570,7 @@ def normalize_path():
                       description: Determines whether the profile process should be promptly initiated (*prompt*) or queued (*deferred*). In the first case, the response waits for the result, in the second the response is immediate returning a ticket corresponding to the request.
                     resource_type:
                       type: string
-                      enum: [csv, shp]
+                      enum: [csv, shp, parquet]
                       description: The file type of the resource
                     csv_delimiter:
                       type: string
@@ -2425,6 +2626,9 @@ def normalize_path():
                   - application/zip:
                       schema:
                         type: object
+                  - application/vnd.apache.parquet:
+                      schema:
+                        type: object
             202:
               description: Accepted for processing, but normalization has not been completed.
               content:
@@ -2452,32 +2656,27 @@ def normalize_path():
     """
     form = NormalizePathForm()
     validate_form(form, mainLogger)
-    src_file_path: str = path.join(getenv('INPUT_DIR', ''), form.resource.data)
-    if not path.exists(src_file_path):
-        abort(400, FILE_NOT_FOUND_MESSAGE)
+    src_file_path: str = resolve_input_path(form.resource.data)
     ticket: str = create_ticket()
     requests_temp_dir: str = path.join(NORMALIZE_TEMP_DIR, ticket)
-    src_file_path: str = save_to_temp(form, requests_temp_dir, input_type="path")
+    src_file_path, filesize = save_to_temp(form, requests_temp_dir, input_type="path", src_file_path=src_file_path)
     src_file_path = uncompress_file(src_file_path)
-    return normalize_endpoint(form, src_file_path, ticket, requests_temp_dir)
+    return normalize_endpoint(form, src_file_path, filesize, ticket, requests_temp_dir)
 
 
-def summarize_endpoint(form: FlaskForm, src_file_path: str, ticket: str, requests_temp_dir: str):
+def summarize_endpoint(form: FlaskForm, src_file_path: str, filesize: int, ticket: str, requests_temp_dir: str):
     # Immediate results
     if form.response.data == "prompt":
         @after_this_request
         def cleanup_temp(resp):
-            delete_from_temp(SUMMARIZE_TEMP_DIR, ticket)
+            resp.call_on_close(lambda: delete_from_temp(SUMMARIZE_TEMP_DIR, ticket))
             return resp
         gdf = get_ds(src_file_path, form, 'vector')
         json_summary = summarize(gdf, form)
         return jsonify(json_summary)
     # Wait for results
     else:
-        init_ticket_to_postgres(ticket, src_file_path)
-        enqueue.submit(ticket, src_file_path, file_type="vector", form=form, job_type=JobType.SUMMARIZE)
-        response = {"ticket": ticket, "endpoint": f"/resource/{ticket}", "status": f"/status/{ticket}"}
-        return make_response(response, 202)
+        return submit_job(ticket, src_file_path, filesize, "vector", form, JobType.SUMMARIZE)
 
 
 @app.route("/summarize/file", methods=["POST"])
@@ -2590,8 +2789,8 @@ def summarize_file():
     validate_form(form, mainLogger)
     ticket: str = create_ticket()
     requests_temp_dir: str = path.join(SUMMARIZE_TEMP_DIR, ticket)
-    src_file_path: str = save_to_temp(form, requests_temp_dir)
-    return summarize_endpoint(form, src_file_path, ticket, requests_temp_dir)
+    src_file_path, filesize = save_to_temp(form, requests_temp_dir)
+    return summarize_endpoint(form, src_file_path, filesize, ticket, requests_temp_dir)
 
 
 @app.route("/summarize/path", methods=["POST"])
@@ -2701,14 +2900,12 @@ def summarize_path():
     """
     form = SummarizePathForm()
     validate_form(form, mainLogger)
-    src_file_path: str = path.join(getenv('INPUT_DIR', ''), form.resource.data)
-    if not path.exists(src_file_path):
-        abort(400, FILE_NOT_FOUND_MESSAGE)
+    src_file_path: str = resolve_input_path(form.resource.data)
     ticket: str = create_ticket()
     requests_temp_dir: str = path.join(SUMMARIZE_TEMP_DIR, ticket)
-    src_file_path: str = save_to_temp(form, requests_temp_dir, input_type="path")
+    src_file_path, filesize = save_to_temp(form, requests_temp_dir, input_type="path", src_file_path=src_file_path)
     src_file_path = uncompress_file(src_file_path)
-    return summarize_endpoint(form, src_file_path, ticket, requests_temp_dir)
+    return summarize_endpoint(form, src_file_path, filesize, ticket, requests_temp_dir)
 
 
 @app.route("/status/<ticket>")
@@ -2756,7 +2953,7 @@ def status(ticket):
           description: Ticket not found.
     """
     if ticket is not None:
-        queue = Queue().get(ticket=ticket)
+        queue = Queue.get(ticket=ticket)
     else:
         return make_response({"status": "'ticket' is required in query parameters."}, 400)
     if queue is None:
@@ -2810,16 +3007,20 @@ def resource(ticket):
     mainLogger.info('API request [endpoint: "%s"]', request.endpoint)
     if ticket is None:
         return make_response('Resource ticket is missing.', 400)
-    queue = Queue().get(ticket=ticket)
+    queue = Queue.get(ticket=ticket)
     if queue is None:
         return make_response({"status": "Ticket not found."}, 404)
-    rel_path = os.path.join(os.environ['OUTPUT_DIR'], queue['result'])
-    if rel_path is None:
+    if queue['result'] is None:
         return make_response('Not found.', 404)
-    file = path.join(getenv('OUTPUT_DIR'), rel_path)
-    if not path.isfile(file):
+    file = path.join(OUTPUT_DIR, queue['result'])
+    try:
+        is_file = stat.S_ISREG(os.stat(file).st_mode)
+    except OSError:
+        is_file = False
+    if not is_file:
         return make_response('Resource does not exist.', 507)
-    return send_file(file, as_attachment=True)
+    return werkzeug.utils.send_file(file, request.environ, as_attachment=True, use_x_sendfile=RESOURCE_X_SENDFILE,
+                                    max_age=app.get_send_file_max_age(file), response_class=app.response_class)
 
 
 # Views
@@ -2837,6 +3038,9 @@ with app.test_request_context():
     spec.path(view=status)
     spec.path(view=resource)
 
+# The document cannot change once all views are registered, so it is serialized only once
+SPEC_JSON: bytes = orjson.dumps(spec.to_dict(), option=orjson.OPT_NON_STR_KEYS)
+
 #
 # Exception handlers
 #
@@ -0,0 +1,36 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class ReportCache(object):
+    """A thread-safe, in-memory LRU cache of serialized reports.
+
+    A cache with a non-positive size is disabled: nothing is stored and every lookup misses.
+    The same holds for a ``None`` key, which callers use for requests that should not be cached.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key):
+        if not self.enabled or key is None:
+            return None
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        if not self.enabled or key is None:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
@@ -1,3 +1,4 @@
+from sqlalchemy import select
 from sqlalchemy.sql import expression
 from sqlalchemy.sql import func
 from geoprofile.database import db
@@ -31,12 +32,17 @@ class Queue(db.Model):
     filesize = db.Column(db.Integer(), nullable=True)
     comment = db.Column(db.Text(), nullable=True)
 
+    FIELDS = ('ticket', 'status', 'success', 'execution_time', 'requested_time', 'result', 'filesize', 'comment')
+
     def __iter__(self):
-        for key in ['ticket', 'status', 'success', 'execution_time', 'requested_time', 'result', 'filesize', 'comment']:
+        for key in self.FIELDS:
             yield key, getattr(self, key)
 
-    def get(self, **kwargs):
-        queue = self.query.filter_by(**kwargs).first()
-        if queue is None:
+    @classmethod
+    def get(cls, **kwargs):
+        """Returns the fields of the first matching row as a dict, without loading it into the session."""
+        statement = select(*[getattr(cls, key) for key in cls.FIELDS]).filter_by(**kwargs).limit(1)
+        row = db.session.execute(statement).first()
+        if row is None:
             return None
-        return dict(queue)
+        return dict(row._mapping)
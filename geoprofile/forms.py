@@ -44,7 +44,7 @@ class BaseForm(FlaskForm):
 class BaseProfileForm(BaseForm):
     basemap_provider = StringField('basemap_provider',
                                    validators=[Optional(),
-                                               AnyOf(list(ctx.providers.keys()),
+                                               AnyOf(frozenset(ctx.providers.keys()),
                                                      "Default is (OpenStreetMap) permitted values are listed here "
                                                      "https://leaflet-extras.github.io/leaflet-providers/preview/")],
                                    default='OpenStreetMap')
@@ -54,6 +54,7 @@ class BaseProfileForm(BaseForm):
     aspect_ratio = FloatField('aspect_ratio', validators=[Optional()])
     width = IntegerField('width', validators=[Optional()])
     height = IntegerField('height', validators=[Optional()])
+    exclude_static = BooleanField('exclude_static', validators=[Optional()])
 
 
 class ProfileFileForm(BaseProfileForm):
@@ -67,8 +68,9 @@ class ProfilePathForm(BaseProfileForm):
 class BaseNormalizeForm(BaseForm):
 
     resource_type = StringField('resource_type', validators=[DataRequired(),
-                                                             AnyOf(['csv', 'shp'],
-                                                                   "Permitted values for resource_type are csv or shp")])
+                                                             AnyOf(['csv', 'shp', 'parquet'],
+                                                                   "Permitted values for resource_type are csv, shp "
+                                                                   "or parquet")])
 
     date_normalization = FieldList(StringField('date_normalization', validators=[Optional()], default=[]),
                                    min_entries=0, validators=[Optional()])
@@ -2,7 +2,7 @@ import os
 import sys
 import traceback
 from itertools import chain
-from logging import getLogger, Filter
+from logging import getLogger, Filter, INFO
 from flask import has_request_context, request
 from datetime import date
 
@@ -81,8 +81,11 @@ _accountingLogger.addFilter(AccountingContextFilter())
 
 def accountingLogger(execution_start, execution_time, filesize, ticket='-', success=1, comment=None):
     assert isinstance(execution_start, date)
+    if not _accountingLogger.isEnabledFor(INFO):
+        return
     success = bool(success)
     execution_start = execution_start.strftime("%Y-%m-%d %H:%M:%S")
     _accountingLogger.info(
-        f"ticket={ticket}, success={success}, execution_start={execution_start}, execution_time={execution_time}, comment={comment} filesize={filesize}")
+        "ticket=%s, success=%s, execution_start=%s, execution_time=%s, comment=%s filesize=%s",
+        ticket, success, execution_start, execution_time, comment, filesize)
 
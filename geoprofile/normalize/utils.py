@@ -27,35 +27,35 @@ def make_zip(zip_name, path_to_zip):
 def perform_date_normalization(form, gdf):
     if form.date_normalization.data:
         for column in form.date_normalization.data:
-            gdf[column] = gdf[column].apply(lambda x: date_normalization(x))
+            gdf[column] = gdf[column].apply(date_normalization)
     return gdf
 
 
 def perform_phone_normalization(form, gdf):
     if form.phone_normalization.data:
         for column in form.phone_normalization.data:
-            gdf[column] = gdf[column].apply(lambda x: phone_normalization(x))
+            gdf[column] = gdf[column].apply(phone_normalization)
     return gdf
 
 
 def perform_special_character_normalization(form, gdf):
     if form.special_character_normalization.data:
         for column in form.special_character_normalization.data:
-            gdf[column] = gdf[column].apply(lambda x: special_character_normalization(x))
+            gdf[column] = gdf[column].apply(special_character_normalization)
     return gdf
 
 
 def perform_alphabetical_normalization(form, gdf):
     if form.alphabetical_normalization.data:
         for column in form.alphabetical_normalization.data:
-            gdf[column] = gdf[column].apply(lambda x: alphabetical_normalization(x))
+            gdf[column] = gdf[column].apply(alphabetical_normalization)
     return gdf
 
 
 def perform_case_normalization(form, gdf):
     if form.case_normalization.data:
         for column in form.case_normalization.data:
-            gdf[column] = gdf[column].apply(lambda x: case_normalization(x))
+            gdf[column] = gdf[column].apply(case_normalization)
     return gdf
 
 
@@ -69,15 +69,19 @@ def perform_transliteration(form, gdf):
             langs = form.transliteration_lang.data
         else:
             abort(400, 'You selected the transliteration option without specifying the sources language(s)')
+
+        def transliterate(blob):
+            return transliteration(blob, langs)
+
         for column in form.transliteration.data:
-            gdf[column] = gdf[column].apply(lambda x: transliteration(x, langs))
+            gdf[column] = gdf[column].apply(transliterate)
     return gdf
 
 
 def perform_value_cleaning(form, gdf):
     if form.value_cleaning.data:
         for column in form.value_cleaning.data:
-            gdf[column] = gdf[column].apply(lambda x: value_cleaning(x))
+            gdf[column] = gdf[column].apply(value_cleaning)
     return gdf
 
 
@@ -120,5 +124,9 @@ def store_gdf(gdf, resource_type, file_name, src_path) -> str:
         stored_path = os.path.join(output_dir + '.zip')
         make_zip(stored_path, output_dir)
         return stored_path
+    elif resource_type == "parquet":
+        stored_path = os.path.join(src_path, file_name + '.parquet')
+        gdf.export(stored_path)
+        return stored_path
     else:
-        abort(400, "Not supported file type, the supported ones are csv and shp")
+        abort(400, "Not supported file type, the supported ones are csv, shp and parquet")
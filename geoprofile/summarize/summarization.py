@@ -11,7 +11,7 @@ DEFAULT_NUMBER_OF_BUCKETS = 10
 
 
 def summarize(gdf, form: BaseSummarizeForm):
-    df = pd.DataFrame(gdf.to_geopandas_df().drop(columns='geometry'))
+    df = attributes_df(gdf)
     json_report = {"column_samples": [], "column_histograms": [], "bounding_box_samples": [], "simplified_geometry": []}
     columns_to_sample = form.columns_to_sample.data if form.columns_to_sample.data else list(df.columns)
     columns_to_hist = form.columns_to_hist.data
@@ -50,6 +50,15 @@ def summarize(gdf, form: BaseSummarizeForm):
     return json_report
 
 
+def attributes_df(gdf) -> pd.DataFrame:
+    """Returns the attribute table of the dataset, without materializing its geometries."""
+    try:
+        columns = [column for column in gdf.get_column_names() if column != 'geometry']
+        return gdf.to_pandas_df(column_names=columns)
+    except AttributeError:
+        return gdf.to_geopandas_df().drop(columns='geometry', errors='ignore')
+
+
 def random_sampling(df, n_samples: int):
     n = define_dataset_sample_number(df, n_samples)
     return df.sample(n).values.tolist()
@@ -77,13 +86,11 @@ def cluster_sampling(df, n_clusters: int, clustering_column_name: str, n_sample_
 
 def single_column_histogram(column, numeric_columns: list, n_buckets: int):
     if column.name in numeric_columns:
-        hist = pd.cut(column, n_buckets).value_counts().sort_index()
+        # counts of a categorical come in the order of its categories, i.e. sorted by bucket
+        hist = pd.cut(column, n_buckets).value_counts(sort=False)
     else:
         hist = column.value_counts()
-    json_hist = []
-    for bucket in hist.index:
-        json_hist.append({'bucket': bucket, 'value': hist[bucket]})
-    return json_hist
+    return [{'bucket': bucket, 'value': value} for bucket, value in zip(hist.index, hist.tolist())]
 
 
 def geo_bounding_box_sampling(gdf, df, n_samples: int, bounding_box: list, columns_to_sample: list):
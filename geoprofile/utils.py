@@ -1,17 +1,24 @@
 import csv
+import io
 import tarfile
 import zipfile
 import os
+import sys
 
+import orjson
 import pandas as pd
 
+from contextlib import contextmanager
+from hashlib import blake2b
 from math import floor
+from typing import Tuple
 from tempfile import gettempdir, mkstemp
 from uuid import uuid4
 from os import path, makedirs, getenv
-from shutil import rmtree, copy
+from shutil import rmtree, copy, copyfileobj
 
 from bigdatavoyant import RasterData
+from osgeo import gdal
 from flask import abort
 from flask_wtf import FlaskForm
 from werkzeug.utils import secure_filename
@@ -20,7 +27,12 @@ import bigdatavoyant as bdv
 
 
 SAMPLE_CAP = 1 / 100
-CONVEX_HULL_MAX_NUM_VERTICES = os.getenv('CONVEX_HULL_MAX_NUM_VERTICES', 1_000_000)
+CONVEX_HULL_MAX_NUM_VERTICES = int(os.getenv('CONVEX_HULL_MAX_NUM_VERTICES', 1_000_000))
+SCHEMATA_PATH = os.getenv('SCHEMATA_PATH')
+COPY_BUFFER_SIZE = 1024 * 1024
+INPUT_DIR = path.realpath(getenv('INPUT_DIR', ''))
+# The base64 encoded PNG maps of a report
+STATIC_MAP_FIELDS = ('mbrStatic', 'convexHullStatic', 'thumbnail', 'heatmapStatic', 'clustersStatic')
 
 
 def validate_form(form: FlaskForm, logger) -> None:
@@ -84,6 +96,27 @@ def uncompress_file(src_file: str) -> str:
         abort(400, 'File not found')
 
 
+def uncompress_raster(src_file: str) -> str:
+    """Returns a GDAL virtual path for a raster zipped on its own, otherwise falls back to uncompress_file"""
+    if zipfile.is_zipfile(src_file):
+        with zipfile.ZipFile(src_file, 'r') as handle:
+            members = [info.filename for info in handle.infolist() if not info.is_dir()]
+        if len(members) == 1:
+            # The archive path is braced, so that GDAL does not split it at a '.zip' inside a directory name
+            vsi_path = f"/vsizip/{{{src_file}}}/{members[0]}"
+            if is_raster(vsi_path):
+                return vsi_path
+    return uncompress_file(src_file)
+
+
+def is_raster(file_path: str) -> bool:
+    """Checks whether GDAL can open the file as a raster"""
+    try:
+        return gdal.OpenEx(file_path, gdal.OF_RASTER) is not None
+    except RuntimeError:
+        return False
+
+
 def mkdir(folder_path: str) -> None:
     """Creates recursively the path, ignoring warnings for existing directories."""
     try:
@@ -99,18 +132,133 @@ def get_tmp_dir(namespace: str) -> str:
     return tempdir
 
 
-def save_to_temp(form: FlaskForm, requests_temp_dir: str, input_type: str = "file") -> str:
+def copy_stream(src, dst) -> int:
+    """Copies the remainder of a binary stream into an open file and returns the number of bytes copied.
+
+    Streams backed by a file on disk are copied in-kernel with sendfile(2); the rest in large chunks.
+    """
+    start = src.tell()
+    src.seek(0, io.SEEK_END)
+    end = src.tell()
+    src.seek(start)
+    # A single buffer's worth gains nothing from sendfile, and asking a small spooled upload
+    # for its descriptor would first write it out to disk
+    if end - start > COPY_BUFFER_SIZE and hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        try:
+            src_fd = src.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass
+        else:
+            offset = start
+            while offset < end:
+                sent = os.sendfile(dst.fileno(), src_fd, offset, end - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            src.seek(offset)
+            return offset - start
+    written = dst.tell()
+    copyfileobj(src, dst, COPY_BUFFER_SIZE)
+    return dst.tell() - written
+
+
+def resolve_input_path(resource: str) -> str:
+    """Resolves a path relative to the input directory, rejecting missing files and paths outside of it"""
+    src_file_path = path.realpath(path.join(INPUT_DIR, resource))
+    if path.commonpath((INPUT_DIR, src_file_path)) != INPUT_DIR or not path.exists(src_file_path):
+        abort(400, 'File not found')
+    return src_file_path
+
+
+def save_to_temp(form: FlaskForm, requests_temp_dir: str, input_type: str = "file",
+                 src_file_path: str = None) -> Tuple[str, int]:
+    """Saves the resource in the request's temp dir and returns its path along with its size in bytes.
+
+    For path inputs, src_file_path is the resource as resolved by resolve_input_path.
+    """
     mkdir(requests_temp_dir)
     if input_type == "file":
         filename = secure_filename(form.resource.data.filename)
         dst_file_path = path.join(requests_temp_dir, filename)
-        form.resource.data.save(dst_file_path)
+        with open(dst_file_path, 'wb', buffering=0) as dst:
+            filesize = copy_stream(form.resource.data.stream, dst)
     else:
-        src_file_path: str = path.join(getenv('INPUT_DIR', ''), form.resource.data)
-        copy(src_file_path, requests_temp_dir)
         filename = secure_filename(form.resource.data.split(os.sep)[-1])
         dst_file_path = path.join(requests_temp_dir, filename)
-    return dst_file_path
+        copy(src_file_path, dst_file_path)
+        filesize = path.getsize(dst_file_path)
+    return dst_file_path, filesize
+
+
+def upload_size(form: FlaskForm) -> int:
+    """Returns the size in bytes of the uploaded resource, without consuming its stream"""
+    stream = form.resource.data.stream
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+    return size
+
+
+def is_archive(stream) -> bool:
+    """Checks whether a (seekable) stream holds a zip or tar archive, leaving it rewound"""
+    try:
+        if zipfile.is_zipfile(stream):
+            return True
+        stream.seek(0)
+        try:
+            with tarfile.open(fileobj=stream, mode='r:*'):
+                return True
+        except tarfile.TarError:
+            return False
+    finally:
+        stream.seek(0)
+
+
+def is_archive_file(file_path: str) -> bool:
+    """Checks whether the file is a zip or tar archive"""
+    with open(file_path, 'rb') as handle:
+        return is_archive(handle)
+
+
+def load_to_vsimem(form: FlaskForm, ticket: str, data: bytes) -> str:
+    """Places the uploaded bytes in GDAL's in-memory filesystem and returns their /vsimem/ path"""
+    vsimem_path = f"/vsimem/{ticket}/{secure_filename(form.resource.data.filename)}"
+    gdal.FileFromMemBuffer(vsimem_path, data)
+    return vsimem_path
+
+
+@contextmanager
+def gdal_thread_config(key: str, value: str):
+    """Sets a GDAL configuration option for the calling thread only, for the duration of the block"""
+    previous = gdal.GetThreadLocalConfigOption(key, None)
+    gdal.SetThreadLocalConfigOption(key, value)
+    try:
+        yield
+    finally:
+        gdal.SetThreadLocalConfigOption(key, previous)
+
+
+def delete_from_vsimem(vsimem_path: str) -> None:
+    """Releases a file placed in GDAL's in-memory filesystem"""
+    gdal.Unlink(vsimem_path)
+
+
+def buffer_digest(data: bytes) -> str:
+    """Returns the BLAKE2b digest of an in-memory buffer, matching file_digest"""
+    return blake2b(data, digest_size=20).hexdigest()
+
+
+def file_digest(file_path: str) -> str:
+    """Returns the BLAKE2b digest of the file's contents"""
+    digest = blake2b(digest_size=20)
+    with open(file_path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(COPY_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def form_signature(form: FlaskForm) -> str:
+    """Returns a stable representation of the submitted options, except for the resource itself"""
+    return repr(sorted((name, value) for name, value in form.data.items() if name not in ('resource', 'response')))
 
 
 def delete_from_temp(temp_path: str, ticket: str) -> None:
@@ -171,16 +319,35 @@ def get_resized_report(gdf, form: FlaskForm, geo_type: str):
     if geo_type == 'vector':
         report = gdf.profiler.report(basemap_provider=form.basemap_provider.data, basemap_name=form.basemap_name.data,
                                      aspect_ratio=ratio, width=width, height=height,
-                                     schemaDefs=os.getenv('SCHEMATA_PATH'),
+                                     schemaDefs=SCHEMATA_PATH,
                                      convex_hull_max_num_vertices=CONVEX_HULL_MAX_NUM_VERTICES)
         # use the summarizers samples
         report["samples"] = get_sample(gdf)
     else:
         report = gdf.report(basemap_provider=form.basemap_provider.data, basemap_name=form.basemap_name.data,
                             aspect_ratio=ratio, width=width, height=height)
+    if form.exclude_static.data:
+        content = report_to_dict(report)
+        for field in STATIC_MAP_FIELDS:
+            if field in content:
+                report[field] = None
     return report
 
 
+def report_to_dict(report) -> dict:
+    """Returns the plain dict holding the contents of a bigdatavoyant report"""
+    to_dict = getattr(report, 'to_dict', None)
+    return to_dict() if to_dict is not None else report.report
+
+
+def report_to_json(report) -> bytes:
+    """Serializes a profiling report with orjson, falling back to the report's own encoder for unsupported values"""
+    try:
+        return orjson.dumps(report_to_dict(report), option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    except (TypeError, ValueError, AttributeError):
+        return report.to_json().encode('utf-8')
+
+
 def get_delimiter(ds_path: str):
     """ Returns the delimiter of the csv file """
     if ds_path.split('.')[-1] != 'csv':
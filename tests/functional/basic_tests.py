@@ -1,11 +1,21 @@
 import json
-from os import path, getenv, mkdir
-from io import StringIO
+from os import path, getenv, mkdir, stat, utime
+from io import StringIO, BytesIO
 import logging
 import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+from unittest import mock
+from uuid import uuid4
 import pandas as pd
+from osgeo import gdal
 
+import geoprofile.app as profile_app
 from geoprofile.app import app
+from geoprofile.cache import ReportCache
+from geoprofile.database import db
+from geoprofile.database.model import Queue
 
 # Setup/Teardown
 from geoprofile.normalize.normalization_functions import date_normalization, phone_normalization, \
@@ -48,6 +58,35 @@ xls_path = path.join(dirname, '..', 'test_data/KFZ_AT_09112022.xls')
 lon_lat_csv_path = path.join(dirname, '..', 'test_data/KFZ_AT_09112022_lonlat.csv')
 
 
+def _input_path(file_path: str) -> str:
+    """Path inputs are resolved under INPUT_DIR, so they are given relative to it"""
+    return path.relpath(file_path, getenv('INPUT_DIR') or '.')
+
+
+class _CountingReportCache(ReportCache):
+    """A report cache that counts its hits"""
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self.hits = 0
+
+    def get(self, key):
+        value = super().get(key)
+        if value is not None:
+            self.hits += 1
+        return value
+
+
+@contextmanager
+def _report_cache():
+    """Enable a fresh report cache for the duration of the block"""
+    report_cache = profile_app.report_cache
+    profile_app.report_cache = _CountingReportCache(4)
+    try:
+        yield profile_app.report_cache
+    finally:
+        profile_app.report_cache = report_cache
+
+
 def _check_all_fields_are_present(expected: set, r: dict, api_path: str):
     """Check that all expected fields are present in a JSON response object (only examines top-level fields)"""
     missing = expected.difference(r.keys())
@@ -127,6 +166,17 @@ def test_profile_raster_file_input_prompt():
     _check_endpoint(path_to_test, data, expected_fields)
 
 
+def test_profile_zipped_raster_file_input_prompt():
+    zip_path = path.join(_tempdir, 'profile_zipped_raster_file_input_prompt.zip')
+    with zipfile.ZipFile(zip_path, 'w') as handle:
+        handle.write(raster_sample_path, 'raster.tif')
+    data = {'resource': (open(zip_path, 'rb'), 'profile_zipped_raster_file_input_prompt.zip')}
+    path_to_test = '/profile/file/raster'
+    expected_fields = {'assetType', 'info', 'statistics', 'histogram', 'mbr', 'resolution', 'cog', 'numberOfBands',
+                       'datatypes', 'noDataValue', 'crs', 'colorInterpretation', 'thumbnail'}
+    _check_endpoint(path_to_test, data, expected_fields)
+
+
 def test_profile_raster_file_input_deferred():
     data = {'resource': (open(raster_sample_path, 'rb'), 'profile_raster_file_input_deferred.tif'),
             'response': 'deferred'}
@@ -135,6 +185,77 @@ def test_profile_raster_file_input_deferred():
     _check_endpoint(path_to_test, data, expected_fields)
 
 
+def test_profile_raster_file_input_prompt_above_limit_is_deferred():
+    path_to_test = '/profile/file/raster'
+    prompt_max_bytes = profile_app.PROMPT_MAX_BYTES
+    profile_app.PROMPT_MAX_BYTES = 1
+    try:
+        with app.test_client() as client:
+            data = {'resource': (open(raster_sample_path, 'rb'), 'profile_raster_file_input_above_limit.tif')}
+            res = client.post(path_to_test, data=data, content_type='multipart/form-data')
+            assert res.status_code == 202
+            _check_all_fields_are_present({'endpoint', 'status', 'ticket'}, res.get_json(), path_to_test)
+            # The limit does not apply when a prompt response is forced
+            data = {'resource': (open(raster_sample_path, 'rb'), 'profile_raster_file_input_above_limit.tif')}
+            res = client.post(path_to_test, data=data, content_type='multipart/form-data',
+                              headers={'X-Force-Prompt': 'true'})
+            assert res.status_code == 200
+    finally:
+        profile_app.PROMPT_MAX_BYTES = prompt_max_bytes
+
+
+def test_profile_deferred_request_rejected_when_queue_is_full():
+    data = {'resource': (open(raster_sample_path, 'rb'), 'profile_deferred_request_queue_full.tif'),
+            'response': 'deferred'}
+    # An exhausted semaphore stands in for a full queue; jobs still running release the one they acquired
+    queued_jobs = profile_app.queued_jobs
+    full = threading.BoundedSemaphore(1)
+    full.acquire()
+    profile_app.queued_jobs = full
+    try:
+        with app.test_client() as client:
+            res = client.post('/profile/file/raster', data=data, content_type='multipart/form-data')
+            assert res.status_code == 503
+    finally:
+        profile_app.queued_jobs = queued_jobs
+
+
+def test_profile_raster_file_input_prompt_from_memory():
+    file_name = 'profile_raster_file_input_prompt_from_memory.tif'
+    data = {'resource': (open(raster_sample_path, 'rb'), file_name)}
+    path_to_test = '/profile/file/raster'
+    expected_fields = {'assetType', 'info', 'statistics', 'histogram', 'mbr', 'resolution', 'cog', 'numberOfBands',
+                       'datatypes', 'noDataValue', 'crs', 'colorInterpretation', 'thumbnail'}
+    vsimem_max_bytes = profile_app.VSIMEM_MAX_BYTES
+    profile_app.VSIMEM_MAX_BYTES = path.getsize(raster_sample_path)
+    try:
+        _check_endpoint(path_to_test, data, expected_fields)
+    finally:
+        profile_app.VSIMEM_MAX_BYTES = vsimem_max_bytes
+    # The in-memory copy is released once the report is built
+    assert not any(f.endswith(file_name) for f in gdal.ReadDirRecursive('/vsimem/') or [])
+
+
+def test_profile_raster_file_input_prompt_report_cache():
+    path_to_test = '/profile/file/raster'
+
+    def profile(client, **fields):
+        data = {'resource': (open(raster_sample_path, 'rb'), 'profile_raster_file_input_report_cache.tif'), **fields}
+        res = client.post(path_to_test, data=data, content_type='multipart/form-data')
+        assert res.status_code == 200
+        return res.get_json()
+
+    with _report_cache() as report_cache, app.test_client() as client:
+        first = profile(client)
+        assert report_cache.hits == 0
+        # The same file with the same options is served from the cache
+        assert profile(client) == first
+        assert report_cache.hits == 1
+        # Any other option makes a new report
+        profile(client, width='640')
+        assert report_cache.hits == 1
+
+
 def test_profile_vector_file_input_prompt():
     data = {'resource': (open(vector_sample_path, 'rb'), 'profile_vector_file_input_prompt.zip')}
     path_to_test = '/profile/file/vector'
@@ -190,7 +311,7 @@ def test_profile_vector_file_input_deferred():
 
 
 def test_profile_netcdf_path_input_prompt():
-    data = {'resource': netcdf_sample_path}
+    data = {'resource': _input_path(netcdf_sample_path)}
     path_to_test = '/profile/path/netcdf'
     expected_fields = {'assetType', 'metadata', 'dimensionsSize', 'dimensionsList', 'dimensionsProperties',
                        'variablesSize', 'variablesList', 'variablesProperties', 'mbr', 'temporalExtent',
@@ -199,14 +320,14 @@ def test_profile_netcdf_path_input_prompt():
 
 
 def test_profile_netcdf_path_input_deferred():
-    data = {'resource': netcdf_sample_path, 'response': 'deferred'}
+    data = {'resource': _input_path(netcdf_sample_path), 'response': 'deferred'}
     path_to_test = '/profile/path/netcdf'
     expected_fields = {'endpoint', 'status', 'ticket'}
     _check_endpoint(path_to_test, data, expected_fields, content_type=URL_ENCODED_STR)
 
 
 def test_profile_raster_path_input_prompt():
-    data = {'resource': raster_sample_path}
+    data = {'resource': _input_path(raster_sample_path)}
     path_to_test = '/profile/path/raster'
     expected_fields = {'assetType', 'info', 'statistics', 'histogram', 'mbr', 'resolution', 'cog', 'numberOfBands',
                        'datatypes', 'noDataValue', 'crs', 'colorInterpretation'}
@@ -214,14 +335,44 @@ def test_profile_raster_path_input_prompt():
 
 
 def test_profile_raster_path_input_deferred():
-    data = {'resource': raster_sample_path, 'response': 'deferred'}
+    data = {'resource': _input_path(raster_sample_path), 'response': 'deferred'}
     path_to_test = '/profile/path/raster'
     expected_fields = {'endpoint', 'status', 'ticket'}
     _check_endpoint(path_to_test, data, expected_fields, content_type=URL_ENCODED_STR)
 
 
+def test_profile_raster_path_input_in_place_writes_no_sidecar():
+    data = {'resource': _input_path(raster_sample_path)}
+    with app.test_client() as client:
+        res = client.post('/profile/path/raster', data=data, content_type=URL_ENCODED_STR)
+        assert res.status_code == 200
+    assert not path.exists(raster_sample_path + '.aux.xml')
+
+
+def test_profile_raster_path_input_prompt_report_cache():
+    data = {'resource': _input_path(raster_sample_path)}
+    st = stat(raster_sample_path)
+
+    def profile(client):
+        res = client.post('/profile/path/raster', data=data, content_type=URL_ENCODED_STR)
+        assert res.status_code == 200
+
+    with _report_cache() as report_cache, app.test_client() as client:
+        profile(client)
+        # An unchanged file is served from the cache
+        profile(client)
+        assert report_cache.hits == 1
+        # A file modified since is profiled again
+        utime(raster_sample_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        try:
+            profile(client)
+            assert report_cache.hits == 1
+        finally:
+            utime(raster_sample_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
 def test_profile_vector_path_input_prompt():
-    data = {'resource':  vector_sample_path}
+    data = {'resource': _input_path(vector_sample_path)}
     path_to_test = '/profile/path/vector'
     expected_fields = {'attributes', 'clusters', 'clustersStatic', 'convexHull', 'count', 'crs', 'datatypes',
                        'distinct', 'distribution', 'featureCount', 'heatmap', 'heatmapStatic', 'mbr', 'quantiles',
@@ -230,12 +381,90 @@ def test_profile_vector_path_input_prompt():
 
 
 def test_profile_vector_path_input_deferred():
-    data = {'resource': vector_sample_path, 'response': 'deferred'}
+    data = {'resource': _input_path(vector_sample_path), 'response': 'deferred'}
     path_to_test = '/profile/path/vector'
     expected_fields = {'endpoint', 'status', 'ticket'}
     _check_endpoint(path_to_test, data, expected_fields, content_type=URL_ENCODED_STR)
 
 
+def test_profile_path_input_outside_input_dir():
+    data = {'resource': '../' * 16 + 'etc/passwd'}
+    with app.test_client() as client:
+        res = client.post('/profile/path/raster', data=data, content_type=URL_ENCODED_STR)
+        assert res.status_code == 400
+
+
+def _profile_with_and_without_static_maps(path_to_test: str, sample_path: str, file_name: str) -> tuple:
+    """Profile the same file twice, with and without exclude_static, returning both reports"""
+    reports = []
+    with app.test_client() as client:
+        for exclude_static in ('false', 'true'):
+            data = {'resource': (open(sample_path, 'rb'), file_name), 'exclude_static': exclude_static}
+            res = client.post(path_to_test, data=data, content_type='multipart/form-data')
+            assert res.status_code == 200
+            reports.append(res.get_json())
+    return tuple(reports)
+
+
+def test_profile_vector_file_input_exclude_static():
+    full, excluded = _profile_with_and_without_static_maps('/profile/file/vector', vector_sample_path,
+                                                           'profile_vector_file_input_exclude_static.zip')
+    assert full.keys() == excluded.keys()
+    assert excluded['mbrStatic'] is None
+    for field in ('convexHullStatic', 'heatmapStatic', 'clustersStatic'):
+        assert excluded.get(field) is None
+
+
+def test_profile_raster_file_input_exclude_static():
+    full, excluded = _profile_with_and_without_static_maps('/profile/file/raster', raster_sample_path,
+                                                           'profile_raster_file_input_exclude_static.tif')
+    assert full.keys() == excluded.keys()
+    assert excluded['thumbnail'] is None
+    assert excluded['statistics'] == full['statistics']
+
+
+def test_profile_netcdf_file_input_exclude_static():
+    full, excluded = _profile_with_and_without_static_maps('/profile/file/netcdf', netcdf_sample_path,
+                                                           'profile_netcdf_file_input_exclude_static.nc')
+    assert full.keys() == excluded.keys()
+    assert excluded['statistics'] == full['statistics']
+
+
+def _finished_ticket(result) -> str:
+    """Register a completed job with the given result path, returning its ticket"""
+    ticket = str(uuid4())
+    with app.app_context():
+        db.session.add(Queue(ticket=ticket, filesize=0, status=1, success=1, result=result))
+        db.session.commit()
+    return ticket
+
+
+def test_get_resource_with_x_sendfile():
+    result = path.abspath(path.join(profile_app.OUTPUT_DIR, 'get_resource_with_x_sendfile.json'))
+    with open(result, 'w') as handle:
+        handle.write('{}')
+    ticket = _finished_ticket(result)
+    x_sendfile = profile_app.RESOURCE_X_SENDFILE
+    profile_app.RESOURCE_X_SENDFILE = True
+    try:
+        with app.test_client() as client:
+            res = client.get(f'/resource/{ticket}')
+            assert res.status_code == 200
+            assert res.headers['X-Sendfile'] == result
+            assert res.get_data() == b''
+    finally:
+        profile_app.RESOURCE_X_SENDFILE = x_sendfile
+
+
+def test_get_resource_without_result():
+    with app.test_client() as client:
+        res = client.get(f'/resource/{_finished_ticket(None)}')
+        assert res.status_code == 404
+        # A result that is not a regular file is reported as missing
+        res = client.get(f'/resource/{_finished_ticket(path.abspath(profile_app.OUTPUT_DIR))}')
+        assert res.status_code == 507
+
+
 def test_get_health_check():
     with app.test_client() as client:
         res = client.get('/_health', query_string=dict(), headers=dict())
@@ -247,6 +476,50 @@ def test_get_health_check():
         assert r['status'] == 'OK'
 
 
+def test_get_health_check_filesystem_probe():
+    probes = []
+    failing = True
+    now = 1000.0
+
+    def probe(dir_path):
+        probes.append(dir_path)
+        if failing:
+            raise OSError('Read-only file system')
+
+    def get_health(client):
+        res = client.get('/_health')
+        assert res.status_code == 200
+        return res.get_json()
+
+    with mock.patch.object(profile_app, 'check_directory_writable', probe), \
+            mock.patch.object(profile_app, 'monotonic', lambda: now), \
+            mock.patch.object(profile_app, 'filesystem_checked_at', float('-inf')), \
+            app.test_client() as client:
+        r = get_health(client)
+        assert r['status'] == 'FAILED' and r['details']['filesystem'] == 'Read-only file system'
+        # A failure is not cached
+        probed = len(probes)
+        assert get_health(client)['status'] == 'FAILED'
+        assert len(probes) > probed
+        failing = False
+        assert get_health(client)['status'] == 'OK'
+        # A success is trusted until the interval has passed
+        probed = len(probes)
+        now += profile_app.FILESYSTEM_CHECK_INTERVAL - 1
+        assert get_health(client)['status'] == 'OK'
+        assert len(probes) == probed
+        now += 2
+        assert get_health(client)['status'] == 'OK'
+        assert len(probes) > probed
+
+
+def test_get_health_check_db_failure():
+    with mock.patch.object(profile_app.db.session, 'execute', side_effect=Exception('Connection refused')), \
+            app.test_client() as client:
+        r = client.get('/_health').get_json()
+        assert r['status'] == 'FAILED' and r['details']['db'] == 'Connection refused'
+
+
 def test_normalization_functions():
     # Date tests
     d: str = "19-09-2015"
@@ -304,6 +577,19 @@ def test_normalize_transliterate_csv_file_input_prompt():
         assert list(reversed(list(df['name'])))[1:4] == expected
 
 
+def test_normalize_csv_file_input_to_parquet_prompt():
+    payload = {'resource_type': 'parquet', 'crs': 'WGS 84',
+               'resource': (open(corfu_csv_path, 'rb'), 'normalize_csv_file_input_to_parquet_prompt.csv')}
+    path_to_test = '/normalize/file'
+    with app.test_client() as client:
+        res = client.post(path_to_test, data=payload, content_type='multipart/form-data')
+        assert res.status_code == 200
+        # Test if the result reads back as parquet, geometry included
+        df = pd.read_parquet(BytesIO(res.get_data()))
+        assert len(df.index) == len(pd.read_csv(corfu_csv_path, sep='|').index)
+        assert 'name' in df.columns and 'geometry' in df.columns
+
+
 def test_normalize_csv_file_input_deferred():
     data = {'resource': (open(corfu_csv_path, 'rb'), 'normalize_csv_file_input_deferred.csv'),
             'response': 'deferred', 'resource_type': 'csv', 'crs': 'WGS 84'}
@@ -0,0 +1,49 @@
+from geoprofile.cache import ReportCache
+
+
+def test_cache_hit_and_miss():
+    cache = ReportCache(2)
+    assert cache.get('a') is None
+    cache.put('a', b'{"a": 1}')
+    assert cache.get('a') == b'{"a": 1}'
+    assert cache.get('b') is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ReportCache(2)
+    cache.put('a', b'a')
+    cache.put('b', b'b')
+    # Reading 'a' makes 'b' the least recently used entry
+    assert cache.get('a') == b'a'
+    cache.put('c', b'c')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'a'
+    assert cache.get('c') == b'c'
+
+
+def test_cache_put_refreshes_existing_key():
+    cache = ReportCache(2)
+    cache.put('a', b'a')
+    cache.put('b', b'b')
+    cache.put('a', b'A')
+    cache.put('c', b'c')
+    assert cache.get('a') == b'A'
+    assert cache.get('b') is None
+
+
+def test_disabled_cache_stores_nothing():
+    for size in (0, -1):
+        cache = ReportCache(size)
+        assert not cache.enabled
+        cache.put('a', b'a')
+        assert cache.get('a') is None
+
+
+def test_none_key_is_never_cached():
+    cache = ReportCache(2)
+    cache.put(None, b'a')
+    assert cache.get(None) is None
+    cache.put('a', b'a')
+    cache.put('b', b'b')
+    # The None key did not take up a slot
+    assert cache.get('a') == b'a'
@@ -0,0 +1,35 @@
+import tempfile
+import threading
+from os import path
+from shutil import copy
+
+from osgeo import gdal
+
+from geoprofile.utils import gdal_thread_config
+
+dirname = path.dirname(__file__)
+raster_sample_path = path.join(dirname, '..', 'test_data/S2A_MSIL1C_20170102T111442_N0204_R137_T30TXT_20170102T111441_'
+                                              'TCI_cloudoptimized_512.tif')
+
+
+def _nodata(raster_path: str):
+    return gdal.Open(raster_path).GetRasterBand(1).GetNoDataValue()
+
+
+def test_pam_is_disabled_only_within_the_block_and_thread():
+    with tempfile.TemporaryDirectory() as tempdir:
+        raster_path = copy(raster_sample_path, path.join(tempdir, 'raster.tif'))
+        # A nodata value kept only in the .aux.xml sidecar next to the raster
+        with open(raster_path + '.aux.xml', 'w') as handle:
+            handle.write('<PAMDataset><PAMRasterBand band="1"><NoDataValue>123</NoDataValue>'
+                         '</PAMRasterBand></PAMDataset>')
+        assert _nodata(raster_path) == 123
+        with gdal_thread_config('GDAL_PAM_ENABLED', 'NO'):
+            assert _nodata(raster_path) != 123
+            # Other threads, e.g. the ones profiling uploads, still read the sidecar
+            other = []
+            thread = threading.Thread(target=lambda: other.append(_nodata(raster_path)))
+            thread.start()
+            thread.join()
+            assert other == [123]
+        assert _nodata(raster_path) == 123
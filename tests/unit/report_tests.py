@@ -0,0 +1,20 @@
+import json
+from os import path
+
+import numpy as np
+from bigdatavoyant import RasterData
+
+from geoprofile.utils import report_to_json
+
+dirname = path.dirname(__file__)
+raster_sample_path = path.join(dirname, '..', 'test_data/S2A_MSIL1C_20170102T111442_N0204_R137_T30TXT_20170102T111441_'
+                                              'TCI_cloudoptimized_512.tif')
+
+
+def test_report_to_json_serializes_numpy_values_and_non_str_keys():
+    report = RasterData.from_file(raster_sample_path).report()
+    report['extra'] = {1: np.int64(3), 'ratio': np.float32(0.5), 'counts': np.array([1, 2], dtype=np.uint8)}
+    r = json.loads(report_to_json(report))
+    assert set(r.keys()) == set(json.loads(report.to_json()).keys())
+    assert r['extra'] == {'1': 3, 'ratio': 0.5, 'counts': [1, 2]}
+
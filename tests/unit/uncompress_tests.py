@@ -0,0 +1,31 @@
+import tempfile
+import zipfile
+from os import path
+
+from osgeo import gdal
+
+from geoprofile.utils import uncompress_raster
+
+dirname = path.dirname(__file__)
+raster_sample_path = path.join(dirname, '..', 'test_data/S2A_MSIL1C_20170102T111442_N0204_R137_T30TXT_20170102T111441_'
+                                              'TCI_cloudoptimized_512.tif')
+
+
+def test_uncompress_raster_reads_a_zipped_raster_in_place():
+    with tempfile.TemporaryDirectory() as tempdir:
+        zip_path = path.join(tempdir, 'raster.zip')
+        with zipfile.ZipFile(zip_path, 'w') as handle:
+            handle.write(raster_sample_path, 'raster.tif')
+        src_path = uncompress_raster(zip_path)
+        assert src_path.startswith('/vsizip/')
+        assert gdal.Open(src_path) is not None
+
+
+def test_uncompress_raster_extracts_a_single_member_that_is_not_a_raster():
+    with tempfile.TemporaryDirectory() as tempdir:
+        zip_path = path.join(tempdir, 'notes.zip')
+        with zipfile.ZipFile(zip_path, 'w') as handle:
+            handle.writestr('notes.txt', 'not a raster')
+        src_path = uncompress_raster(zip_path)
+        assert not src_path.startswith('/vsizip/')
+        assert path.isfile(path.join(src_path, 'notes.txt'))